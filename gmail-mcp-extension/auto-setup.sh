@@ -8,7 +8,7 @@ echo ""
 # Configuration
 HOST_NAME="com.gmail.mcp.bridge"
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
-HOST_PATH="$SCRIPT_DIR/mcp-server/native-host.py"
+HOST_PATH="$SCRIPT_DIR/mcp-server/native-host-mcp.py"
 
 # Check if running on macOS
 if [[ "$OSTYPE" == "darwin"* ]]; then
@@ -3,42 +3,219 @@
 import sys
 import json
 import struct
-import subprocess
+import asyncio
 import threading
 import time
 import queue
 import os
+import fcntl
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson encodes straight to bytes and is several times faster than the
+# stdlib; fall back to json so the host still runs without it installed.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can
+# catch the stdlib exception either way.
+if orjson:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+    def _dumps(message):
+        return json.dumps(message).encode('utf-8')
+    _loads = json.loads
+
+# Longest line the MCP server may write; Chrome itself caps messages from
+# the host at 1 MB, so anything near this is a broken server
+MCP_LINE_LIMIT = 1 << 24
+
+# Pipe size for the MCP server's stdio on Linux. The default 64 KiB means
+# a large response crosses the pipe in many small blocking writes.
+MCP_PIPE_SIZE = 1 << 20
+# Linux-only; the fcntl module only names it from Python 3.10
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031 if sys.platform.startswith('linux') else None)
+
+# Chrome frames messages with a 32-bit length in native byte order
+_FRAME_LENGTH = struct.Struct('=I')
+_pack_length = _FRAME_LENGTH.pack
+_unpack_length = _FRAME_LENGTH.unpack
+
+# Pings are the most frequent message, so their reply is pre-encoded and
+# only the id is filled in
+_PONG_PREFIX = b'{"id":'
+_PONG_CONNECTED = b',"response":{"status":"pong","mcp_connected":true}}'
+_PONG_DISCONNECTED = b',"response":{"status":"pong","mcp_connected":false}}'
 
 # Logging
-def log(message):
-    with open('/tmp/native-host-mcp.log', 'a') as f:
-        f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
-        f.flush()
+LOG_FILE = '/tmp/native-host-mcp.log'
+LOG_QUEUE_SIZE = 4096
+LOG_BUFFER_SIZE = 1 << 16
+LOG_FLUSH_INTERVAL = 0.1
+# Per-message traffic is only logged with NATIVE_HOST_LOG=debug
+LOG_DEBUG = os.environ.get('NATIVE_HOST_LOG', '').lower() == 'debug'
+
+_log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+def log(message, *args):
+    """Queue a log line for the writer thread; dropped if the queue is full.
+    
+    With args, message is a %-format string applied by the writer thread.
+    """
+    try:
+        _log_queue.put_nowait((time.time(), message, args))
+    except queue.Full:
+        pass
+
+def debug(message, *args):
+    """Like log(), but only when debug logging is enabled"""
+    if LOG_DEBUG:
+        log(message, *args)
+
+def write_log():
+    """Append queued log lines, flushing when idle or every LOG_FLUSH_INTERVAL"""
+    with open(LOG_FILE, 'a', buffering=LOG_BUFFER_SIZE) as f:
+        last_flush = time.monotonic()
+        # strftime is only needed once per second; reuse the cached stamp
+        last_second = None
+        stamp = ''
+        # Lines lost to bad entries or failed writes; stdout belongs to Chrome,
+        # so the first failure and the final count go to stderr
+        dropped = 0
+        while True:
+            entry = _log_queue.get()
+            if entry is None:
+                break
+            
+            # One bad entry or a failed write must not stop the writer
+            try:
+                timestamp, message, args = entry
+                if args:
+                    message = message % args
+                second = int(timestamp)
+                if second != last_second:
+                    last_second = second
+                    stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+                f.write(f"{stamp} - {message}\n")
+            except Exception as e:
+                if not dropped:
+                    report_log_failure(e)
+                dropped += 1
+            
+            now = time.monotonic()
+            if _log_queue.empty() or now - last_flush >= LOG_FLUSH_INTERVAL:
+                last_flush = now
+                try:
+                    f.flush()
+                except Exception as e:
+                    if not dropped:
+                        report_log_failure(e)
+                    dropped += 1
+        
+        if dropped:
+            report_log_failure(f"{dropped} log writes failed")
+
+def report_log_failure(error):
+    """Tell stderr that log lines are being lost"""
+    try:
+        sys.stderr.write(f"native-host-mcp: cannot write {LOG_FILE}: {error}\n")
+        sys.stderr.flush()
+    except Exception:
+        pass
+
+def stop_log():
+    """Flush pending log lines and stop the writer thread"""
+    try:
+        _log_queue.put(None, timeout=1)
+    except queue.Full:
+        return
+    _log_writer.join(timeout=1)
+
+_log_writer = threading.Thread(target=write_log, daemon=True)
+_log_writer.start()
+
+def open_pipe():
+    """Create a pipe, enlarged to MCP_PIPE_SIZE where the kernel allows it"""
+    read_fd, write_fd = os.pipe()
+    if F_SETPIPE_SZ:
+        try:
+            fcntl.fcntl(write_fd, F_SETPIPE_SZ, MCP_PIPE_SIZE)
+        except OSError:
+            # Above pipe-max-size or the user's pipe quota; keep the default
+            pass
+    return read_fd, write_fd
+
+class PipeWriter(asyncio.Protocol):
+    """Write end of a pipe whose users can wait until the reader catches up"""
+    
+    def __init__(self):
+        self.transport = None
+        self.resumed = None
+        self.closed = asyncio.get_running_loop().create_future()
+    
+    def connection_made(self, transport):
+        self.transport = transport
+    
+    def connection_lost(self, exc):
+        self.resume_writing()
+        if not self.closed.done():
+            self.closed.set_result(None)
+    
+    def pause_writing(self):
+        self.resumed = asyncio.get_running_loop().create_future()
+    
+    def resume_writing(self):
+        if self.resumed and not self.resumed.done():
+            self.resumed.set_result(None)
+        self.resumed = None
+    
+    def write(self, data):
+        self.transport.write(data)
+    
+    def writelines(self, data):
+        self.transport.writelines(data)
+    
+    async def drain(self):
+        """Wait while the transport holds more than its high-water mark"""
+        if self.resumed:
+            await self.resumed
 
 class MCPBridge:
+    # Handlers touch several attributes per message; slots make those
+    # lookups direct and keep stray attributes from creeping in
+    __slots__ = (
+        'mcp_process', 'mcp_in', 'mcp_out', 'mcp_tasks', 'chrome_out', 'chrome_frames',
+        'pending_requests', 'chrome_to_mcp', 'request_counter'
+    )
+    
     def __init__(self):
         self.mcp_process = None
-        self.mcp_queue = queue.Queue()
-        self.chrome_queue = queue.Queue()
+        self.mcp_in = None
+        self.mcp_out = None
+        self.mcp_tasks = []
+        # Everything runs on one event loop, which is therefore the sole
+        # owner of pending_requests and chrome_to_mcp
+        self.chrome_out = None
+        self.chrome_frames = []
         self.pending_requests = {}
+        # Reverse index of pending_requests (chrome_id -> mcp_id); whatever
+        # adds or removes a pending request must update both
+        self.chrome_to_mcp = {}
         self.request_counter = 0
         
-    def start_mcp_server(self):
+    async def start_mcp_server(self):
         """Start the MCP server as a subprocess"""
         try:
             mcp_path = os.path.join(os.path.dirname(__file__), 'index.js')
-            self.mcp_process = subprocess.Popen(
-                ['node', mcp_path],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
-            )
+            await self.spawn_mcp_server(mcp_path)
             log("MCP server started")
             
-            # Start thread to read MCP output
-            threading.Thread(target=self.read_mcp_output, daemon=True).start()
+            # Read MCP output on the event loop
+            self.mcp_tasks = [
+                asyncio.create_task(self.read_mcp_output()),
+                asyncio.create_task(self.read_mcp_errors()),
+            ]
             
             # Initialize MCP connection
             self.send_to_mcp({
@@ -58,26 +235,112 @@ class MCPBridge:
         except Exception as e:
             log(f"Failed to start MCP server: {e}")
     
-    def read_mcp_output(self):
+    async def spawn_mcp_server(self, mcp_path):
+        """Run node on mcp_path with its stdin and stdout on enlarged pipes"""
+        # The pipes are created here so they can be resized; stderr only
+        # carries diagnostics and keeps the default size
+        stdin_read, stdin_write = open_pipe()
+        stdout_read, stdout_write = open_pipe()
+        try:
+            self.mcp_process = await asyncio.create_subprocess_exec(
+                'node', mcp_path,
+                stdin=stdin_read,
+                stdout=stdout_write,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except BaseException:
+            os.close(stdin_write)
+            os.close(stdout_read)
+            raise
+        finally:
+            # The child has its own copies of these ends
+            os.close(stdin_read)
+            os.close(stdout_write)
+        
+        loop = asyncio.get_running_loop()
+        self.mcp_out = asyncio.StreamReader(limit=MCP_LINE_LIMIT)
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(self.mcp_out), os.fdopen(stdout_read, 'rb', 0)
+        )
+        _, self.mcp_in = await loop.connect_write_pipe(PipeWriter, os.fdopen(stdin_write, 'wb', 0))
+    
+    async def read_mcp_output(self):
         """Read output from MCP server"""
-        while self.mcp_process and self.mcp_process.poll() is None:
+        # Bind everything the loop calls per line to locals once
+        readline = self.mcp_out.readline
+        loads = _loads
+        handle = self.handle_mcp_message
+        # Only wait for Chrome here: waiting for the server to read its stdin
+        # while we stop reading its stdout would deadlock the two pipes
+        drain = self.chrome_out.drain
+        while True:
             try:
-                line = self.mcp_process.stdout.readline()
-                if line:
-                    log(f"MCP output: {line.strip()}")
-                    try:
-                        message = json.loads(line)
-                        self.handle_mcp_message(message)
-                    except json.JSONDecodeError:
-                        pass
-            except Exception as e:
+                line = await readline()
+            except ValueError as e:
                 log(f"Error reading MCP output: {e}")
+                continue
+            if not line:
+                log("MCP server closed its output")
+                return
+            
+            debug("MCP output: %r", line)
+            try:
+                message = loads(line)
+            except json.JSONDecodeError:
+                continue
+            try:
+                handle(message)
+            except Exception as e:
+                log(f"Error handling MCP message: {e}")
+            await drain()
+    
+    async def read_mcp_errors(self):
+        """Drain MCP stderr so the server never blocks on a full pipe"""
+        stderr = self.mcp_process.stderr
+        while True:
+            try:
+                line = await stderr.readline()
+            except ValueError:
+                continue
+            if not line:
+                return
+            debug("MCP stderr: %r", line)
+    
+    async def read_chrome_input(self, reader):
+        """Handle framed messages from Chrome until it closes the pipe"""
+        # Bind everything the loop calls per frame to locals once
+        readexactly = reader.readexactly
+        unpack_length = _unpack_length
+        loads = _loads
+        handle = self.handle_chrome_message
+        drain_chrome = self.chrome_out.drain
+        while True:
+            try:
+                raw_length = await readexactly(4)
+            except asyncio.IncompleteReadError:
+                return
+            try:
+                message_data = await readexactly(unpack_length(raw_length)[0])
+            except asyncio.IncompleteReadError:
+                log("Chrome closed the pipe mid-message")
+                return
+            
+            try:
+                message = loads(message_data)
+                handle(message)
+            except Exception as e:
+                log(f"Error handling Chrome message: {e}")
+            # Stop reading Chrome while either side isn't keeping up
+            await drain_chrome()
+            if self.mcp_in:
+                await self.mcp_in.drain()
     
     def handle_mcp_message(self, message):
         """Handle messages from MCP server"""
         if 'id' in message and message['id'] in self.pending_requests:
             # This is a response to our request
             request_info = self.pending_requests.pop(message['id'])
+            self.chrome_to_mcp.pop(request_info['chrome_id'], None)
             
             # Forward response to Chrome
             if 'result' in message:
@@ -95,25 +358,40 @@ class MCPBridge:
     
     def send_to_mcp(self, message):
         """Send message to MCP server"""
-        if self.mcp_process and self.mcp_process.poll() is None:
+        if self.mcp_in and self.mcp_process.returncode is None:
             try:
-                self.mcp_process.stdin.write(json.dumps(message) + '\n')
-                self.mcp_process.stdin.flush()
-                log(f"Sent to MCP: {message}")
+                self.mcp_in.write(_dumps(message) + b'\n')
+                debug("Sent to MCP: %s", message)
             except Exception as e:
                 log(f"Error sending to MCP: {e}")
     
     def send_to_chrome(self, message):
         """Send message to Chrome extension"""
         try:
-            encoded_message = json.dumps(message).encode('utf-8')
-            sys.stdout.buffer.write(struct.pack('I', len(encoded_message)))
-            sys.stdout.buffer.write(encoded_message)
-            sys.stdout.buffer.flush()
-            log(f"Sent to Chrome: {message}")
+            self.send_chrome_frame(_dumps(message))
+            debug("Sent to Chrome: %s", message)
         except Exception as e:
             log(f"Error sending to Chrome: {e}")
     
+    def send_chrome_frame(self, frame):
+        """Queue an encoded message; frames queued in one loop pass go out together"""
+        if not self.chrome_frames:
+            asyncio.get_running_loop().call_soon(self.flush_chrome_output)
+        self.chrome_frames.append(_pack_length(len(frame)))
+        self.chrome_frames.append(frame)
+    
+    def flush_chrome_output(self):
+        """Write every queued frame to Chrome in one call"""
+        frames = self.chrome_frames
+        self.chrome_frames = []
+        if self.chrome_out.transport.is_closing():
+            # Chrome is gone; writing would only make asyncio complain on stderr
+            return
+        try:
+            self.chrome_out.writelines(frames)
+        except Exception as e:
+            log(f"Error writing to Chrome: {e}")
+    
     def get_next_id(self):
         """Get next request ID"""
         self.request_counter += 1
@@ -121,29 +399,27 @@ class MCPBridge:
     
     def handle_chrome_message(self, message):
         """Handle messages from Chrome extension"""
-        log(f"Received from Chrome: {message}")
+        debug("Received from Chrome: %s", message)
         
         # Handle ping
         if message.get('action') == 'ping':
-            self.send_to_chrome({
-                "id": message.get('id'),
-                "response": {"status": "pong", "mcp_connected": self.mcp_process is not None}
-            })
+            suffix = _PONG_CONNECTED if self.mcp_process is not None else _PONG_DISCONNECTED
+            self.send_chrome_frame(_PONG_PREFIX + _dumps(message.get('id')) + suffix)
+            debug("Sent pong to Chrome: id=%s", message.get('id'))
             return
         
         # Handle responses from Chrome extension (content script results)
         if message.get('response') and message.get('id'):
             # This is a response from content script, check if we have a pending MCP request
-            for mcp_id, info in self.pending_requests.items():
-                if info.get('chrome_id') == message.get('id'):
-                    # Found the matching request, send to MCP
-                    self.pending_requests.pop(mcp_id)
-                    # Forward the actual data to whoever requested it
-                    self.send_to_chrome({
-                        "id": message.get('id'),
-                        "response": message.get('response')
-                    })
-                    return
+            mcp_id = self.chrome_to_mcp.pop(message.get('id'), None)
+            if mcp_id is not None:
+                # Found the matching request, send to MCP
+                self.pending_requests.pop(mcp_id, None)
+                # Forward the actual data to whoever requested it
+                self.send_to_chrome({
+                    "id": message.get('id'),
+                    "response": message.get('response')
+                })
             return
         
         # Handle Gmail actions - for now just forward back to Chrome to get real data
@@ -151,7 +427,7 @@ class MCPBridge:
         if action in ['getEmails', 'getEmailContent', 'composeReply', 'sendEmail']:
             # We need to forward this to Chrome extension to get real Gmail data
             # For now, just acknowledge and wait for the real implementation
-            log(f"Received {action} request, needs real Gmail data")
+            debug("Received %s request, needs real Gmail data", action)
             
             # Since we're not fully integrated yet, return mock data
             if action == 'getEmails':
@@ -176,48 +452,61 @@ class MCPBridge:
                 "error": f"Unknown action: {action}"
             })
     
-    def run(self):
+    async def run(self):
         """Main loop"""
         log("MCP Bridge started")
         
+        # Attach Chrome's stdin and stdout to the event loop
+        loop = asyncio.get_running_loop()
+        chrome_in = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(chrome_in), sys.stdin)
+        _, self.chrome_out = await loop.connect_write_pipe(PipeWriter, sys.stdout)
+        
         # Start MCP server
-        self.start_mcp_server()
+        await self.start_mcp_server()
         
         # Send ready message to Chrome
-        time.sleep(0.5)  # Give MCP time to start
+        await asyncio.sleep(0.5)  # Give MCP time to start
         self.send_to_chrome({"type": "ready", "message": "MCP Bridge is ready"})
         
-        # Read messages from Chrome
-        while True:
-            try:
-                # Read message length
-                raw_length = sys.stdin.buffer.read(4)
-                if len(raw_length) == 0:
-                    break
-                
-                message_length = struct.unpack('I', raw_length)[0]
-                
-                # Read message
-                message_data = sys.stdin.buffer.read(message_length).decode('utf-8')
-                message = json.loads(message_data)
-                
-                # Handle message
-                self.handle_chrome_message(message)
-                
-            except Exception as e:
-                log(f"Error in main loop: {e}")
+        # Read messages from Chrome until it closes either pipe; MCP output
+        # is handled by its own tasks
+        reader = asyncio.create_task(self.read_chrome_input(chrome_in))
+        await asyncio.wait([reader, self.chrome_out.closed], return_when=asyncio.FIRST_COMPLETED)
+        if not reader.done():
+            log("Chrome closed the pipe to the host")
+            reader.cancel()
     
-    def cleanup(self):
+    async def cleanup(self):
         """Clean up resources"""
-        if self.mcp_process:
+        if self.chrome_out:
+            # Send whatever is still queued before closing the pipe
+            if self.chrome_frames:
+                self.flush_chrome_output()
+            self.chrome_out.transport.close()
+            try:
+                await asyncio.wait_for(self.chrome_out.closed, 1)
+            except Exception:
+                pass
+        for task in self.mcp_tasks:
+            task.cancel()
+        if self.mcp_in:
+            self.mcp_in.transport.close()
+        if self.mcp_process and self.mcp_process.returncode is None:
             self.mcp_process.terminate()
-            self.mcp_process.wait()
+            await self.mcp_process.wait()
 
-if __name__ == '__main__':
+async def main():
     bridge = MCPBridge()
     try:
-        bridge.run()
+        await bridge.run()
+    finally:
+        await bridge.cleanup()
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
     except Exception as e:
         log(f"Fatal error: {e}")
     finally:
-        bridge.cleanup()
\ No newline at end of file
+        stop_log()
\ No newline at end of file